@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from validation import char_matrix, string_lengths
+
+
+AGGREGATES_DB = 'detections_aggregates.db'
+
+# Size (degrees) of the square geo cells used as aggregation keys (~1.1 km)
+GEO_CELL_SIZE = 0.01
+
+CHUNK_SIZE = 500_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    file_hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS detection_aggregates (
+    mac_address TEXT NOT NULL,
+    hamming_distance INTEGER NOT NULL,
+    lat_cell INTEGER NOT NULL,
+    lon_cell INTEGER NOT NULL,
+    detections INTEGER NOT NULL,
+    latitude_sum REAL NOT NULL,
+    longitude_sum REAL NOT NULL,
+    PRIMARY KEY (mac_address, hamming_distance, lat_cell, lon_cell)
+);
+"""
+
+UPSERT = """
+INSERT INTO detection_aggregates
+    (mac_address, hamming_distance, lat_cell, lon_cell, detections, latitude_sum, longitude_sum)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (mac_address, hamming_distance, lat_cell, lon_cell) DO UPDATE SET
+    detections = detections + excluded.detections,
+    latitude_sum = latitude_sum + excluded.latitude_sum,
+    longitude_sum = longitude_sum + excluded.longitude_sum
+"""
+
+
+def connect(db_path=AGGREGATES_DB):
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+# Function to hash a file in blocks, so ingestion is keyed by content and not by name
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Function to compute the Hamming distance between two plate columns.
+# Plates of different lengths get the length of the longest one, as in upload_data().
+def hamming_distance(detected, irregular):
+    detected_lengths = string_lengths(detected)
+    irregular_lengths = string_lengths(irregular)
+    width = int(max(
+        string_lengths(detected, in_bytes=True).max(initial=1),
+        string_lengths(irregular, in_bytes=True).max(initial=1),
+    ))
+    differences = (char_matrix(detected, width) != char_matrix(irregular, width)).sum(axis=1)
+    longest = np.maximum(detected_lengths, irregular_lengths)
+    return pd.Series(np.where(detected_lengths == irregular_lengths, differences, longest), index=detected.index)
+
+
+# Function to reduce a chunk of raw detections to camera x Hamming distance x geo cell rows
+def aggregate_chunk(df):
+    if 'hammingDistance' not in df.columns:
+        df = df.assign(hammingDistance=hamming_distance(df['licensePlateDetected'], df['irregularLicensePlate']))
+    df = df.assign(
+        hammingDistance=pd.to_numeric(df['hammingDistance'], errors='coerce'),
+        latitude=pd.to_numeric(df['latitude'], errors='coerce'),
+        longitude=pd.to_numeric(df['longitude'], errors='coerce'),
+    ).dropna(subset=['macAddress', 'hammingDistance', 'latitude', 'longitude'])
+    df = df.assign(
+        lat_cell=np.floor(df['latitude'] / GEO_CELL_SIZE).astype(np.int64),
+        lon_cell=np.floor(df['longitude'] / GEO_CELL_SIZE).astype(np.int64),
+        hammingDistance=df['hammingDistance'].astype(np.int64),
+    )
+    aggregated = df.groupby(['macAddress', 'hammingDistance', 'lat_cell', 'lon_cell'], sort=False).agg(
+        detections=('latitude', 'size'),
+        latitude_sum=('latitude', 'sum'),
+        longitude_sum=('longitude', 'sum'),
+    ).reset_index()
+    return aggregated.rename(columns={'macAddress': 'mac_address', 'hammingDistance': 'hamming_distance'})
+
+
+# Function to fold one CSV into the aggregates.
+# Files already ingested (same content hash) are skipped; each file is applied in
+# a single transaction, so an interrupted ingestion leaves no partial counts behind.
+# A path that was already ingested with different content (a file rewritten or
+# appended in place) is rejected: adding it again would count its rows twice.
+def ingest_file(connection, path):
+    path = Path(path).resolve()
+    digest = file_hash(path)
+    if connection.execute("SELECT 1 FROM ingested_files WHERE file_hash = ?", (digest,)).fetchone():
+        return 0
+    if connection.execute("SELECT 1 FROM ingested_files WHERE path = ?", (str(path),)).fetchone():
+        raise ValueError(f"{path} was already ingested with different content; drop new detections in a new file")
+
+    rows = 0
+    with connection:
+        for chunk in pd.read_csv(path, chunksize=CHUNK_SIZE):
+            rows += len(chunk)
+            aggregated = aggregate_chunk(chunk)
+            connection.executemany(UPSERT, aggregated.itertuples(index=False, name=None))
+        connection.execute(
+            "INSERT INTO ingested_files (file_hash, path, rows, ingested_at) VALUES (?, ?, ?, ?)",
+            (digest, str(path), rows, datetime.now(timezone.utc).isoformat()),
+        )
+    return rows
+
+
+# Function to ingest every new, complete CSV in a directory; returns {path: rows ingested}.
+# Cameras should write to a temporary name that `pattern` does not match (e.g.
+# detections.csv.part) and rename the file when done. As a second guard, files
+# modified less than `settle_seconds` ago are left for a later run.
+# `seen` (path -> (size, mtime)) lets a watcher skip files it already handled
+# without hashing them again.
+def ingest_directory(connection, directory, pattern='*.csv', settle_seconds=30.0, seen=None):
+    ingested = {}
+    now = time.time()
+    for path in sorted(Path(directory).glob(pattern)):
+        stat = path.stat()
+        state = (stat.st_size, stat.st_mtime_ns)
+        if now - stat.st_mtime < settle_seconds:
+            continue
+        if seen is not None and seen.get(path) == state:
+            continue
+        try:
+            rows = ingest_file(connection, path)
+        except ValueError as error:
+            print(f"{path}: skipped, {error}")
+            rows = 0
+        if seen is not None:
+            seen[path] = state
+        if rows:
+            ingested[str(path)] = rows
+    return ingested
+
+
+# Function to poll a directory and ingest new detection files as they land
+def watch(directory, db_path=AGGREGATES_DB, interval=10.0, pattern='*.csv', settle_seconds=30.0):
+    connection = connect(db_path)
+    seen = {}
+    while True:
+        for path, rows in ingest_directory(connection, directory, pattern, settle_seconds, seen).items():
+            print(f"{path}: {rows} detections ingested")
+        time.sleep(interval)
+
+
+# Function to read the aggregates, optionally rolled up to a subset of the keys
+def load_aggregates(connection, by=('mac_address', 'hamming_distance', 'lat_cell', 'lon_cell')):
+    keys = ', '.join(by)
+    query = f"""
+        SELECT {keys}, SUM(detections) AS detections,
+               SUM(latitude_sum) AS latitude_sum, SUM(longitude_sum) AS longitude_sum
+        FROM detection_aggregates
+        GROUP BY {keys}
+    """
+    return pd.read_sql_query(query, connection)
+
+
+# Function to read the full aggregate table, or None if the store was never built
+# or holds no detections yet (the watcher creates it before the first file settles)
+def read_store(db_path=AGGREGATES_DB):
+    if not Path(db_path).exists():
+        return None
+    connection = connect(db_path)
+    try:
+        aggregated = load_aggregates(connection)
+    finally:
+        connection.close()
+    return aggregated if len(aggregated) else None
+
+
+# Function to get the Hamming distance distribution as a count per distance
+def hamming_distribution(aggregated):
+    return aggregated.groupby('hamming_distance')['detections'].sum()
+
+
+# Function to compute the summary statistics of the Hamming distance from its counts
+def distribution_stats(distribution):
+    values = distribution.index.to_numpy(dtype=float)
+    counts = distribution.to_numpy(dtype=float)
+    total = counts.sum()
+    if total == 0:
+        # No detections (e.g. every row dropped for missing coordinates)
+        return {'count': 0} | dict.fromkeys(['mean', 'median', 'mode', 'std', 'var', 'min', 'max', 'q1', 'q3'], np.nan)
+    mean = (values * counts).sum() / total
+    var = ((values - mean) ** 2 * counts).sum() / (total - 1) if total > 1 else np.nan
+    cumulative = np.cumsum(counts) / total
+
+    def quantile(q):
+        return values[np.searchsorted(cumulative, q)]
+
+    return {
+        'count': int(total),
+        'mean': mean,
+        'median': quantile(0.5),
+        'mode': values[np.argmax(counts)],
+        'std': np.sqrt(var),
+        'var': var,
+        'min': values.min(),
+        'max': values.max(),
+        'q1': quantile(0.25),
+        'q3': quantile(0.75),
+    }
+
+
+# Function to list the files folded into the store, or None if the store was never built
+def ingested_files(db_path=AGGREGATES_DB):
+    if not Path(db_path).exists():
+        return None
+    connection = connect(db_path)
+    try:
+        return pd.read_sql_query("SELECT * FROM ingested_files ORDER BY ingested_at", connection)
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the materialized detection aggregates.")
+    parser.add_argument('command', choices=['ingest', 'watch'], help="ingest once, or keep watching the directory")
+    parser.add_argument('directory', help="directory where detection CSVs are dropped")
+    parser.add_argument('--db', default=AGGREGATES_DB, help=f"SQLite database (default: {AGGREGATES_DB})")
+    parser.add_argument('--pattern', default='*.csv', help="file name pattern (default: *.csv)")
+    parser.add_argument('--interval', type=float, default=10.0, help="polling interval in seconds")
+    parser.add_argument('--settle', type=float, default=30.0,
+                        help="only ingest files not modified for this many seconds (default: 30)")
+    args = parser.parse_args()
+
+    if args.command == 'watch':
+        watch(args.directory, args.db, args.interval, args.pattern, args.settle)
+    else:
+        for path, rows in ingest_directory(connect(args.db), args.directory, args.pattern, args.settle).items():
+            print(f"{path}: {rows} detections ingested")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from validation import MERCOSUL_PATTERN, char_matrix, invalid_plates
+
+
+PLATE_LENGTH = len(MERCOSUL_PATTERN)
+CLUSTER_COLUMN = 'vehicleCluster'
+
+# Plate matrix shared with the worker processes (set by _init_worker)
+_plates = None
+
+
+# Function to list the position subsets used as exact-match keys: every choice of
+# `length - max_distance` positions. Two plates within `max_distance` substitutions
+# agree on all the positions outside their differences, so they share at least one
+# key; two plates sharing a key differ in at most `max_distance` positions. Linking
+# the plates of each key bucket therefore yields exactly the connected components,
+# without comparing plates pairwise. There are C(length, max_distance) keys
+# (7 for d = 1, 21 for d = 2, 35 for d = 3), each costing one sort of the plates.
+def key_positions(max_distance, length=PLATE_LENGTH):
+    return [list(positions) for positions in combinations(range(length), length - max_distance)]
+
+
+# Function to encode the characters at `positions` as one integer key per plate
+def block_keys(plates, positions):
+    keys = np.zeros(len(plates), dtype=np.int64)
+    for position in positions:
+        keys = keys * 128 + plates[:, position]
+    return keys
+
+
+# Function to link every plate to the first plate sharing its key, restricted to one
+# shard of the keys. Returns (first plate, plate) pairs: one per plate, not per pair.
+def block_links(plates, positions, shard=0, n_shards=1):
+    keys = block_keys(plates, positions)
+    rows = np.flatnonzero(keys % n_shards == shard)
+    _, first, inverse = np.unique(keys[rows], return_index=True, return_inverse=True)
+    heads = rows[first][inverse.ravel()]
+    linked = heads != rows
+    return heads[linked], rows[linked]
+
+
+def _init_worker(plates):
+    global _plates
+    _plates = plates
+
+
+def _worker_links(task):
+    return block_links(_plates, *task)
+
+
+# Function to fold one key's links into the component labels (one per plate).
+# Links are applied key by key, so memory stays linear in the number of plates.
+def merge_links(labels, left, right):
+    left, right = labels[left], labels[right]
+    distinct = left != right
+    graph = sparse.coo_matrix(
+        (np.ones(distinct.sum(), dtype=np.int8), (left[distinct], right[distinct])), shape=(len(labels),) * 2
+    )
+    return connected_components(graph, directed=False)[1][labels]
+
+
+# Function to group plate reads that likely belong to the same vehicle.
+# Returns one cluster id per row (-1 for missing plates). Plates that do not
+# follow a valid layout are never merged and keep a cluster of their own.
+def cluster_plates(series, max_distance=1, workers=None):
+    present = series.notna().to_numpy()
+    unique_plates, inverse = np.unique(series[present].astype(str).to_numpy(), return_inverse=True)
+    unique_plates = pd.Series(unique_plates)
+
+    valid = np.flatnonzero(~invalid_plates(unique_plates))
+    plates = char_matrix(unique_plates[valid], PLATE_LENGTH)[:, :PLATE_LENGTH].astype(np.uint8)
+
+    keys = key_positions(max_distance)
+    workers = workers or os.cpu_count() or 1
+    labels = np.arange(len(unique_plates))
+    if workers > 1:
+        tasks = [(positions, shard, workers) for positions in keys for shard in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(plates,)) as executor:
+            for left, right in executor.map(_worker_links, tasks):
+                labels = merge_links(labels, valid[left], valid[right])
+    else:
+        for positions in keys:
+            left, right = block_links(plates, positions)
+            labels = merge_links(labels, valid[left], valid[right])
+    _, cluster_ids = np.unique(labels, return_inverse=True)
+
+    clusters = np.full(len(series), -1, dtype=np.int64)
+    clusters[present] = cluster_ids[inverse]
+    return pd.Series(clusters, index=series.index, name=CLUSTER_COLUMN)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cluster licensePlateDetected reads into physical vehicles and write the cluster id of every record."
+    )
+    parser.add_argument('input', help="CSV with id and licensePlateDetected columns")
+    parser.add_argument('-o', '--output', help="output CSV (id, vehicleCluster), outside any directory watched by "
+                                               "aggregates.py (default: <input>_clusters.csv, read by the analysis page)")
+    parser.add_argument('-d', '--max-distance', type=int, default=1, help="maximum Hamming distance inside a cluster")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    # Never rewrite the input in place: it may be the dataset the pages read or a
+    # file already ingested by aggregates.py
+    output = Path(args.output) if args.output else Path(args.input).with_name(f"{Path(args.input).stem}_clusters.csv")
+    if output.resolve() == Path(args.input).resolve():
+        parser.error("the output must be a different file from the input")
+
+    df = pd.read_csv(args.input, usecols=['id', 'licensePlateDetected'])
+    df[CLUSTER_COLUMN] = cluster_plates(df['licensePlateDetected'], args.max_distance, args.workers)
+    df[['id', CLUSTER_COLUMN]].to_csv(output, index=False)
+    print(f"{df[CLUSTER_COLUMN].nunique()} clusters written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# Shared by the 06-03 and 13-02 apps, which are deployed separately: keep
+# 06-03/src/correlation.py and 13-02/correlation.py identical.
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+
+# Maximum number of (value, count) entries kept by each rank sketch
+SKETCH_SIZE = 2048
+
+
+# Function to hash the raw content of a dataset (used as the cache key)
+def dataset_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+# Function to create the empty accumulator for `columns`.
+# For every pair (i, j) it keeps the sums over the rows where both are present,
+# so each coefficient is computed from pairwise-complete observations.
+def empty_state(columns):
+    p = len(columns)
+    return {
+        'columns': list(columns),
+        'n': np.zeros((p, p)),
+        'sum': np.zeros((p, p)),       # sum of x_i over rows where x_j is also present
+        'sum_sq': np.zeros((p, p)),    # sum of x_i ** 2 over the same rows
+        'cross': np.zeros((p, p)),     # sum of x_i * x_j
+    }
+
+
+# Function to add a chunk (rows x columns array, NaN = missing) to the accumulator
+def accumulate(state, values):
+    present = (~np.isnan(values)).astype(float)
+    filled = np.nan_to_num(values)
+    state['n'] += present.T @ present
+    state['sum'] += filled.T @ present
+    state['sum_sq'] += (filled ** 2).T @ present
+    state['cross'] += filled.T @ filled
+    return state
+
+
+# Function to merge two partial accumulators (e.g. computed by different workers)
+def merge_states(a, b):
+    return {key: a[key] if key == 'columns' else a[key] + b[key] for key in a}
+
+
+# Function to turn the accumulated sums into a correlation matrix
+def correlation_matrix(state):
+    n = state['n']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = state['cross'] - state['sum'] * state['sum'].T / n
+        variance_i = state['sum_sq'] - state['sum'] ** 2 / n
+        variance_j = variance_i.T
+        corr = covariance / np.sqrt(variance_i * variance_j)
+    corr = np.where(n > 1, np.clip(corr, -1, 1), np.nan)
+    return pd.DataFrame(corr, index=state['columns'], columns=state['columns'])
+
+
+# Function to turn the accumulated sums into a (pairwise-complete, sample) covariance matrix
+def covariance_matrix(state):
+    n = state['n']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = (state['cross'] - state['sum'] * state['sum'].T / n) / (n - 1)
+    covariance = np.where(n > 1, covariance, np.nan)
+    return pd.DataFrame(covariance, index=state['columns'], columns=state['columns'])
+
+
+# Function to build/extend the rank sketch of one column: sorted (value, count) pairs,
+# compressed into at most SKETCH_SIZE equal-weight bins once it grows too large
+def update_sketch(sketch, values):
+    values = values[~np.isnan(values)]
+    new_values, new_counts = np.unique(values, return_counts=True)
+    if sketch is not None:
+        return merge_sketches(sketch, (new_values, new_counts.astype(float)))
+    return new_values, new_counts.astype(float)
+
+
+def merge_sketches(a, b):
+    values = np.concatenate([a[0], b[0]])
+    counts = np.concatenate([a[1], b[1]])
+    order = np.argsort(values, kind='stable')
+    values, counts = values[order], counts[order]
+    unique_values, starts = np.unique(values, return_index=True)
+    counts = np.add.reduceat(counts, starts) if len(values) else counts
+    return _compress(unique_values, counts)
+
+
+def _compress(values, counts, size=SKETCH_SIZE):
+    if len(values) <= size:
+        return values, counts
+    cumulative = np.cumsum(counts)
+    bins = np.minimum((cumulative - counts / 2) * size // cumulative[-1], size - 1).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    binned_counts = np.add.reduceat(counts, starts)
+    binned_values = np.add.reduceat(values * counts, starts) / binned_counts
+    return binned_values, binned_counts
+
+
+# Function to map values to (approximate) mid-ranks using a column's sketch
+def sketch_ranks(sketch, values):
+    sketch_values, counts = sketch
+    if len(sketch_values) == 0:
+        return np.full(len(values), np.nan)
+    mid_ranks = np.cumsum(counts) - (counts - 1) / 2
+    ranks = np.interp(values, sketch_values, mid_ranks)
+    return np.where(np.isnan(values), np.nan, ranks)
+
+
+# First pass over a chunk: Pearson sums, one rank sketch per column and, for the
+# pairs whose joint-presence mask differs from the column's own, a sketch of x_i
+# restricted to the rows where x_j is also present (keyed by (i, j)). Pairs
+# without an entry use the column sketch.
+def _first_pass(columns, values):
+    present = ~np.isnan(values)
+    sketches = [update_sketch(None, values[:, k]) for k in range(len(columns))]
+    pair_sketches = {}
+    for i in range(len(columns)):
+        for j in range(len(columns)):
+            if i != j and (present[:, i] & ~present[:, j]).any():
+                pair_sketches[i, j] = update_sketch(None, values[present[:, j], i])
+    return accumulate(empty_state(columns), values), sketches, pair_sketches
+
+
+# Second pass over a chunk: Pearson sums over the ranks (Spearman). Pairs with their
+# own sketches are ranked over the rows where both columns are present.
+def _second_pass(columns, sketches, pair_sketches, values):
+    ranks = np.column_stack([sketch_ranks(sketches[k], values[:, k]) for k in range(len(columns))])
+    state = accumulate(empty_state(columns), ranks)
+
+    pairs = {(min(i, j), max(i, j)) for i, j in pair_sketches}
+    for i, j in pairs:
+        joint = ~np.isnan(values[:, i]) & ~np.isnan(values[:, j])
+        a = sketch_ranks(pair_sketches.get((i, j), sketches[i]), values[joint, i])
+        b = sketch_ranks(pair_sketches.get((j, i), sketches[j]), values[joint, j])
+        state['sum'][i, j], state['sum'][j, i] = a.sum(), b.sum()
+        state['sum_sq'][i, j], state['sum_sq'][j, i] = (a ** 2).sum(), (b ** 2).sum()
+        state['cross'][i, j] = state['cross'][j, i] = (a * b).sum()
+    return state
+
+
+def _chunk_values(chunks, columns):
+    for chunk in chunks:
+        yield chunk[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+# Function to apply `function` to every chunk and fold the results with `combine`.
+# With several workers at most 2 * workers chunks are in flight, so the dataset is
+# never held in memory at once.
+def _map_reduce(function, items, combine, workers):
+    result = None
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for item in items:
+                pending.append(executor.submit(function, item))
+                if len(pending) >= 2 * workers:
+                    partial_result = pending.pop(0).result()
+                    result = partial_result if result is None else combine(result, partial_result)
+            for future in pending:
+                result = future.result() if result is None else combine(result, future.result())
+        return result
+    for item in items:
+        partial_result = function(item)
+        result = partial_result if result is None else combine(result, partial_result)
+    return result
+
+
+def _merge_first_pass(a, b):
+    pair_sketches = {
+        (i, j): merge_sketches(a[2].get((i, j), a[1][i]), b[2].get((i, j), b[1][i]))
+        for i, j in a[2].keys() | b[2].keys()
+    }
+    return merge_states(a[0], b[0]), [merge_sketches(x, y) for x, y in zip(a[1], b[1])], pair_sketches
+
+
+# Function to compute Pearson and Spearman matrices over the numeric columns of a
+# dataset read in chunks. `read_chunks` is a zero-argument callable returning an
+# iterator of DataFrames (it is called twice: sums/sketches, then ranks); chunks
+# are processed by `workers` processes and the partial results merged.
+# Both coefficients use the rows where the two columns are present. Spearman ranks
+# come from rank sketches (per column, or per pair when missing values make the
+# pair's rows differ), so they are exact while a sketch holds at most SKETCH_SIZE
+# distinct values and approximate beyond that.
+def correlate(read_chunks, columns=None, exclude=(), workers=1):
+    if columns is None:
+        first = next(iter(read_chunks()))
+        columns = [c for c in first.select_dtypes('number').columns if c not in exclude]
+
+    state, sketches, pair_sketches = _map_reduce(
+        partial(_first_pass, columns), _chunk_values(read_chunks(), columns), _merge_first_pass, workers
+    )
+    rank_state = _map_reduce(
+        partial(_second_pass, columns, sketches, pair_sketches), _chunk_values(read_chunks(), columns),
+        merge_states, workers
+    )
+
+    return {
+        'pearson': correlation_matrix(state),
+        'spearman': correlation_matrix(rank_state),
+        'covariance': covariance_matrix(state),
+        'pairs': pd.DataFrame(state['n'].astype(np.int64), index=columns, columns=columns),
+    }
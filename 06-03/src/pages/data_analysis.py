@@ -1,13 +1,26 @@
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
+from validation import validate_records, RULE_LABELS
+from clustering import CLUSTER_COLUMN
+from aggregates import AGGREGATES_DB, aggregate_chunk, distribution_stats, file_hash, hamming_distribution, ingested_files, read_store
+from correlation import correlate, dataset_hash
+from spatial import build_index, getis_ord_gi_star, nearest_neighbors, radius_query, HOTSPOT, COLDSPOT, NOT_SIGNIFICANT
+
 
+DATASET_PATH = Path('license_plates_with_hamming_distance.csv')
+# Cluster ids written by clustering.py (id, vehicleCluster)
+CLUSTERS_PATH = DATASET_PATH.with_name(f"{DATASET_PATH.stem}_clusters.csv")
 
 # Function to load data
 @st.cache_data
 def load_data():
     try:
-        df = pd.read_csv('license_plates_with_hamming_distance.csv')
+        df = pd.read_csv(DATASET_PATH)
         # Ensure the Hamming distance is numeric
         df['hammingDistance'] = pd.to_numeric(df['hammingDistance'], errors='coerce')
         return df
@@ -15,6 +28,64 @@ def load_data():
         st.error("Dataset file not found. Please upload the license_plates_with_hamming_distance.csv file.")
         return None
 
+# Function to load the cluster ids by record id, reloaded when the file changes
+@st.cache_data
+def load_clusters(path, mtime):
+    clusters = pd.read_csv(path, index_col='id')[CLUSTER_COLUMN]
+    return clusters[~clusters.index.duplicated()]
+
+# Function to hash the dataset file, re-hashed only when its size or mtime changes
+@st.cache_data
+def dataset_file_hash(path, size, mtime):
+    return file_hash(path)
+
+# Function to get the content hash of the dataset (cache key of the analyses below)
+def dataset_content_hash(data):
+    if DATASET_PATH.exists():
+        stat = DATASET_PATH.stat()
+        return dataset_file_hash(str(DATASET_PATH), stat.st_size, stat.st_mtime_ns)
+    return dataset_hash(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+
+# Function to validate the records once per dataset
+@st.cache_data
+def load_validation(content_hash, _data):
+    return validate_records(_data)
+
+# Function to load the materialized aggregates (kept up to date by aggregates.py)
+@st.cache_data(ttl=60)
+def load_aggregate_store():
+    return read_store()
+
+# Function to list the files behind the aggregate store
+@st.cache_data(ttl=60)
+def load_store_files():
+    return ingested_files()
+
+# Function to describe where a section's numbers come from
+def source_label(from_store, data):
+    if from_store:
+        files = load_store_files()
+        return (f"Fonte: armazenamento agregado ({AGGREGATES_DB}) — histórico completo de "
+                f"{len(files)} arquivos ingeridos, {int(files['rows'].sum())} detecções.")
+    name = DATASET_PATH.name if DATASET_PATH.exists() else "arquivo enviado"
+    return f"Fonte: {name} — {len(data)} registros carregados."
+
+# Function to compute the correlation matrices in chunks, cached per dataset hash
+@st.cache_data
+def load_correlations(content_hash, _read_chunks):
+    return correlate(_read_chunks, exclude=(CLUSTER_COLUMN,))
+
+# Function to build the spatial index of the geo cells once per dataset
+@st.cache_resource
+def load_spatial_index(cells_hash, _cells):
+    return build_index(_cells['latitude'], _cells['longitude'])
+
+# Function to compute the Gi* hotspots of the geo cells, cached per (cells, k, alpha)
+@st.cache_data
+def load_hotspots(cells_hash, k, alpha, _cells):
+    spatial_index = load_spatial_index(cells_hash, _cells)
+    return pd.concat([_cells, getis_ord_gi_star(spatial_index, _cells['hammingDistance'], k, alpha)], axis=1)
+
 # Function to allow user to upload data
 def upload_data():
     uploaded_file = st.file_uploader("Upload your license plate dataset", type=['csv'])
@@ -56,9 +127,16 @@ if data is None:
     else:
         st.success("Dados carregados com sucesso!")
 
+# Join the vehicle clusters computed by clustering.py, when available
+if data is not None and CLUSTERS_PATH.exists() and 'id' in data.columns:
+    clusters = load_clusters(str(CLUSTERS_PATH), CLUSTERS_PATH.stat().st_mtime_ns)
+    data = data.assign(**{CLUSTER_COLUMN: data['id'].map(clusters).fillna(-1).astype(np.int64)})
+
 # Create tabs for different analysis sections
+if data is not None:
 
     st.header("1. Apresentação dos Dados e Tipos de Variáveis")
+    st.caption(source_label(False, data))
     
     # Introduction to the dataset
     st.markdown("""
@@ -94,6 +172,42 @@ if data is None:
         duplicated_rows = data.duplicated().sum()
         st.metric("Linhas Duplicadas", duplicated_rows)
     
+    # Data quality validation (plate layout, MAC format and coordinate bounds)
+    st.subheader("Validação da Qualidade dos Dados")
+    
+    content_hash = dataset_content_hash(data)
+    validation_masks, validation_counts = load_validation(content_hash, data)
+    
+    validation_table = pd.DataFrame({
+        'Regra': [RULE_LABELS[rule] for rule in validation_counts.index if rule != 'any'],
+        'Registros Inválidos': validation_counts.drop('any').values,
+        'Percentual (%)': (validation_counts.drop('any').values / max(len(data), 1) * 100).round(2)
+    })
+    st.table(validation_table)
+    st.metric("Registros com ao menos uma inconsistência", int(validation_counts['any']))
+    
+    if validation_counts['any'] > 0:
+        with st.expander("Ver registros inconsistentes"):
+            st.dataframe(data[validation_masks['any']])
+    
+    # Plate reads grouped into physical vehicles (ids written by clustering.py)
+    if CLUSTER_COLUMN in data.columns:
+        st.subheader("Agrupamento de Leituras por Veículo")
+        
+        cluster_sizes = data[data[CLUSTER_COLUMN] >= 0].groupby(CLUSTER_COLUMN).size()
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Veículos Estimados", cluster_sizes.shape[0])
+        with col2:
+            st.metric("Grupos com Mais de uma Placa", int((cluster_sizes > 1).sum()))
+        
+        largest_clusters = cluster_sizes.sort_values(ascending=False).head(10).index
+        st.dataframe(
+            data[data[CLUSTER_COLUMN].isin(largest_clusters)]
+            .sort_values(CLUSTER_COLUMN)[[CLUSTER_COLUMN, 'licensePlateDetected', 'irregularLicensePlate', 'hammingDistance']]
+        )
+    
     # Data types and description
     st.subheader("Tipos de Variáveis")
     
@@ -144,12 +258,22 @@ if data is None:
 
     st.header("2. Medidas Centrais, Análise Inicial, Dispersão e Correlação")
     
+    # Summary measures come from the aggregate store when it exists, so they cover
+    # the whole detection history without re-reading the raw files
+    aggregated = load_aggregate_store()
+    from_store = aggregated is not None
+    if not from_store:
+        aggregated = aggregate_chunk(data)
+    st.caption(source_label(from_store, data))
+    distribution = hamming_distribution(aggregated)
+    hamming_stats = distribution_stats(distribution)
+    
     # Central tendency measures for Hamming Distance
     st.subheader("Medidas de Tendência Central da Distância de Hamming")
     
-    hamming_mean = data['hammingDistance'].mean()
-    hamming_median = data['hammingDistance'].median()
-    hamming_mode = data['hammingDistance'].mode()[0]
+    hamming_mean = hamming_stats['mean']
+    hamming_median = hamming_stats['median']
+    hamming_mode = hamming_stats['mode']
     
     col1, col2, col3 = st.columns(3)
     
@@ -166,9 +290,11 @@ if data is None:
     st.subheader("Distribuição da Distância de Hamming")
     
     fig = px.histogram(
-        data, 
-        x='hammingDistance',
+        x=distribution.index,
+        y=distribution.values,
+        histfunc='sum',
         nbins=10,
+        labels={'x': 'hammingDistance', 'y': 'count'},
         title='Distribuição da Distância de Hamming',
         color_discrete_sequence=['#3b82f6']
     )
@@ -186,10 +312,10 @@ if data is None:
     # Dispersion metrics
     st.subheader("Medidas de Dispersão")
     
-    hamming_std = data['hammingDistance'].std()
-    hamming_var = data['hammingDistance'].var()
-    hamming_range = data['hammingDistance'].max() - data['hammingDistance'].min()
-    hamming_iqr = data['hammingDistance'].quantile(0.75) - data['hammingDistance'].quantile(0.25)
+    hamming_std = hamming_stats['std']
+    hamming_var = hamming_stats['var']
+    hamming_range = hamming_stats['max'] - hamming_stats['min']
+    hamming_iqr = hamming_stats['q3'] - hamming_stats['q1']
     
     col1, col2 = st.columns(2)
     
@@ -204,29 +330,172 @@ if data is None:
     # Box plot for Hamming Distance
     st.subheader("Box Plot da Distância de Hamming")
     
-    fig = px.box(
-        data, 
-        y='hammingDistance',
-        title='Box Plot da Distância de Hamming',
-        color_discrete_sequence=['#3b82f6']
+    # Box drawn from the precomputed quartiles (Tukey fences clipped to the observed range)
+    fig = go.Figure(go.Box(
+        name='hammingDistance',
+        q1=[hamming_stats['q1']],
+        median=[hamming_stats['median']],
+        q3=[hamming_stats['q3']],
+        lowerfence=[max(hamming_stats['min'], hamming_stats['q1'] - 1.5 * hamming_iqr)],
+        upperfence=[min(hamming_stats['max'], hamming_stats['q3'] + 1.5 * hamming_iqr)],
+        marker_color='#3b82f6'
+    ))
+    fig.update_layout(title='Box Plot da Distância de Hamming', yaxis_title='hammingDistance')
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Correlation between the numeric variables
+    st.subheader("Matriz de Correlação")
+    st.caption(source_label(False, data))
+    
+    # Stream the dataset file when it is on disk; otherwise use the uploaded data
+    if DATASET_PATH.exists():
+        read_chunks = lambda: pd.read_csv(DATASET_PATH, chunksize=500_000)
+    else:
+        read_chunks = lambda: (data.iloc[start:start + 500_000] for start in range(0, len(data), 500_000))
+    correlations = load_correlations(dataset_content_hash(data), read_chunks)
+    
+    correlation_method = st.radio("Método", ['pearson', 'spearman'], horizontal=True, format_func=str.capitalize)
+    fig = px.imshow(
+        correlations[correlation_method],
+        text_auto='.2f',
+        zmin=-1,
+        zmax=1,
+        color_continuous_scale='RdBu_r',
+        title=f'Correlação de {correlation_method.capitalize()} entre as Variáveis Numéricas'
     )
     st.plotly_chart(fig, use_container_width=True)
     
+    st.markdown("""
+    **Análise da Correlação:**
+    
+    Os coeficientes são calculados com as observações completas de cada par de variáveis (inclusive os postos 
+    usados pela correlação de Spearman). A correlação de Pearson mede relações lineares, enquanto a de Spearman, 
+    baseada em postos, capta relações monotônicas. Valores próximos 
+    de zero entre as coordenadas e a distância de Hamming indicam que, globalmente, a localização não explica 
+    linearmente a magnitude dos erros.
+    """)
+    
     # Geographical analysis
     st.subheader("Análise Geográfica de Erros de Detecção")
+    st.caption(source_label(from_store, data))
     
     # Create a geospatial visualization
     st.markdown("Mapa de calor das distâncias de Hamming por localização:")
     
+    # One point per geo cell, at the centroid of its detections
+    geo_cells = aggregated.assign(
+        hamming_sum=aggregated['hamming_distance'] * aggregated['detections']
+    ).groupby(['lat_cell', 'lon_cell'])[['detections', 'hamming_sum', 'latitude_sum', 'longitude_sum']].sum()
+    geo_cells = pd.DataFrame({
+        'latitude': geo_cells['latitude_sum'] / geo_cells['detections'],
+        'longitude': geo_cells['longitude_sum'] / geo_cells['detections'],
+        'hammingDistance': geo_cells['hamming_sum'] / geo_cells['detections'],
+        'detections': geo_cells['detections'],
+    }).reset_index(drop=True)
+    
     fig = px.scatter_mapbox(
-        data, 
+        geo_cells, 
         lat='latitude', 
         lon='longitude', 
         color='hammingDistance',
         size='hammingDistance',
+        hover_data=['detections'],
         color_continuous_scale=px.colors.sequential.Viridis,
         mapbox_style="carto-positron",
         zoom=10,
         title='Distribuição Geográfica das Distâncias de Hamming'
     )
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Hotspot analysis (Getis-Ord Gi*) on the geo cells, with k-nearest-neighbour weights
+    st.subheader("Hotspots de Erros de Detecção (Getis-Ord Gi*)")
+    
+    cells_hash = dataset_hash(pd.util.hash_pandas_object(geo_cells).to_numpy().tobytes())
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        hotspot_k = st.slider("Células vizinhas (k)", 4, 32, 8)
+    with col2:
+        hotspot_alpha = st.selectbox("Taxa de falsas descobertas (FDR)", [0.10, 0.05, 0.01], index=1)
+    with col3:
+        max_cell_detections = int(geo_cells['detections'].max())
+        if max_cell_detections > 1:
+            min_detections = st.slider("Mínimo de detecções por célula", 1, max_cell_detections, min(10, max_cell_detections))
+        else:
+            # st.slider needs a non-empty range
+            min_detections = 1
+            st.caption("Todas as células têm uma única detecção.")
+    
+    # A cell's mean is only as reliable as its number of reads: cells with few
+    # detections are left out, so a single read does not weigh as much as thousands
+    hotspot_cells = geo_cells[geo_cells['detections'] >= min_detections].reset_index(drop=True)
+    
+    st.markdown("""
+    A estatística Gi* compara a distância de Hamming média de cada célula geográfica e das suas k células 
+    mais próximas com o esperado se os erros estivessem distribuídos aleatoriamente. Valores de z positivos e 
+    significativos indicam concentrações de erros (hotspots); negativos indicam regiões com menos erros que o esperado (coldspots).
+    
+    Como cada célula é um teste, os p-valores são corrigidos pelo método de Benjamini-Hochberg (q-valor): 
+    sem a correção, cerca de 5% das células seriam marcadas mesmo com erros distribuídos ao acaso.
+    """)
+    
+    if len(hotspot_cells) <= hotspot_k:
+        st.info(f"Apenas {len(hotspot_cells)} células têm ao menos {min_detections} detecções; "
+                f"são necessárias mais de {hotspot_k} para a análise de hotspots.")
+    else:
+        hotspots_hash = dataset_hash(pd.util.hash_pandas_object(hotspot_cells).to_numpy().tobytes())
+        hotspots = load_hotspots(hotspots_hash, hotspot_k, hotspot_alpha, hotspot_cells)
+        st.caption(f"{len(hotspot_cells)} de {len(geo_cells)} células, com {int(hotspot_cells['detections'].sum())} "
+                   f"de {int(geo_cells['detections'].sum())} detecções.")
+        
+        fig = px.scatter_mapbox(
+            hotspots,
+            lat='latitude',
+            lon='longitude',
+            color='hotspot',
+            size='detections',
+            color_discrete_map={HOTSPOT: '#ef4444', COLDSPOT: '#3b82f6', NOT_SIGNIFICANT: '#d1d5db'},
+            hover_data=['detections', 'hammingDistance', 'gi_z_score', 'gi_p_value', 'gi_q_value'],
+            mapbox_style="carto-positron",
+            zoom=10,
+            title='Clusters Significativos de Erros de Detecção'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+        st.table(hotspots.assign(
+            hamming_sum=hotspots['hammingDistance'] * hotspots['detections']
+        ).groupby('hotspot').agg(
+            Células=('detections', 'size'),
+            Detecções=('detections', 'sum'),
+            hamming_sum=('hamming_sum', 'sum')
+        ).assign(**{
+            'Distância de Hamming Média': lambda table: table['hamming_sum'] / table['Detecções']
+        }).drop(columns='hamming_sum'))
+    
+    # Neighbourhood queries on the spatial index of the geo cells
+    st.subheader("Consulta por Proximidade")
+    
+    spatial_index = load_spatial_index(cells_hash, geo_cells)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        query_lat = st.number_input("Latitude", value=float(geo_cells['latitude'].mean()), format="%.6f")
+    with col2:
+        query_lon = st.number_input("Longitude", value=float(geo_cells['longitude'].mean()), format="%.6f")
+    with col3:
+        query_radius = st.slider("Raio (km)", 0.5, 20.0, 5.0, 0.5)
+    with col4:
+        query_k = st.number_input("Células mais próximas (k)", min_value=1, max_value=50, value=5)
+    
+    in_radius = geo_cells.iloc[radius_query(spatial_index, query_lat, query_lon, query_radius)[0]]
+    radius_detections = int(in_radius['detections'].sum())
+    st.metric(
+        f"Detecções em até {query_radius:.1f} km",
+        radius_detections,
+        help=f"Distância de Hamming média na região: {(in_radius['hammingDistance'] * in_radius['detections']).sum() / radius_detections:.2f}" if radius_detections else None
+    )
+    
+    neighbor_distances, neighbor_positions = nearest_neighbors(spatial_index, query_lat, query_lon, min(int(query_k), len(geo_cells)))
+    nearest = geo_cells.iloc[np.atleast_1d(neighbor_positions[0])].copy()
+    nearest['Distância (km)'] = np.atleast_1d(neighbor_distances[0])
+    st.dataframe(nearest)
\ No newline at end of file
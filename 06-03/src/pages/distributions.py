@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy import stats
+from aggregates import AGGREGATES_DB, aggregate_chunk, distribution_stats, hamming_distribution, ingested_files, read_store
 
 # Function to load data
 @st.cache_data
@@ -16,6 +17,16 @@ def load_data():
         st.error("Dataset file not found. Please upload the license_plates_with_hamming_distance.csv file.")
         return None
 
+# Function to load the materialized aggregates (kept up to date by aggregates.py)
+@st.cache_data(ttl=60)
+def load_aggregate_store():
+    return read_store()
+
+# Function to list the files behind the aggregate store
+@st.cache_data(ttl=60)
+def load_store_files():
+    return ingested_files()
+
 # Function to allow user to upload data
 def upload_data():
     uploaded_file = st.file_uploader("Upload your license plate dataset", type=['csv'])
@@ -46,16 +57,30 @@ def upload_data():
         return df
     return None
 
-# Load or upload data
-data = load_data()
-if data is None:
-    data = upload_data()
+# Use the aggregate store when available; otherwise load or upload the raw data
+aggregated = load_aggregate_store()
+data = None
+if aggregated is None:
+    data = load_data()
     if data is None:
-        st.warning("Por favor, carregue o arquivo de dados para continuar.")
-    else:
-        st.success("Dados carregados com sucesso!")
+        data = upload_data()
+        if data is None:
+            st.warning("Por favor, carregue o arquivo de dados para continuar.")
+        else:
+            st.success("Dados carregados com sucesso!")
+    if data is not None:
+        aggregated = aggregate_chunk(data)
 
-if data is not None:
+if aggregated is not None:
+    if data is None:
+        files = load_store_files()
+        st.caption(f"Fonte: armazenamento agregado ({AGGREGATES_DB}) — histórico completo de "
+                   f"{len(files)} arquivos ingeridos, {int(files['rows'].sum())} detecções.")
+    else:
+        st.caption(f"Fonte: dados carregados — {len(data)} registros.")
+    distribution = hamming_distribution(aggregated)
+    hamming_stats = distribution_stats(distribution)
+    
     tab1, tab2, tab3 = st.tabs([
         "1. Distribuição Binomial", 
         "2. Distribuição de Poisson", 
@@ -83,7 +108,7 @@ if data is not None:
         """)
         
         # Calculate proportion of errors (Hamming distance > 0)
-        error_prob = (data['hammingDistance'] > 0).mean()
+        error_prob = distribution[distribution.index > 0].sum() / hamming_stats['count']
         
         # Number of trials for binomial simulation
         n_trials = st.slider("Número de detecções a simular", 10, 100, 50)
@@ -117,7 +142,7 @@ if data is not None:
         """)
         
         # Group errors by MAC address
-        errors_by_camera = data[data['hammingDistance'] > 1].groupby('macAddress').size().reset_index()
+        errors_by_camera = aggregated[aggregated['hamming_distance'] > 1].groupby('mac_address')['detections'].sum().reset_index()
         errors_by_camera.columns = ['macAddress', 'error_count']
         
         # Calculate the average error rate per camera
@@ -151,8 +176,8 @@ if data is not None:
         """)
         
         # Calculate the mean and standard deviation of Hamming distance
-        hamming_mean = data['hammingDistance'].mean()
-        hamming_std = data['hammingDistance'].std()
+        hamming_mean = hamming_stats['mean']
+        hamming_std = hamming_stats['std']
         
         # Create a range for the x-axis
         x = np.linspace(max(0, hamming_mean - 4*hamming_std), hamming_mean + 4*hamming_std, 1000)
@@ -165,8 +190,7 @@ if data is not None:
         ax.plot(x, pdf, 'b-', lw=2, label='Normal PDF')
         
         # Plot histograma normal
-        hist_data = data['hammingDistance']
-        ax.hist(hist_data, bins=20, density=True, alpha=0.5, color='skyblue', label='Dados Observados')
+        ax.hist(distribution.index, weights=distribution.values, bins=20, density=True, alpha=0.5, color='skyblue', label='Dados Observados')
         
         ax.set_xlabel('Distância de Hamming')
         ax.set_ylabel('Densidade de Probabilidade')
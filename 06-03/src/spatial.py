@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+from scipy.spatial import cKDTree
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Labels for the Gi* classification
+HOTSPOT = 'Hotspot'
+COLDSPOT = 'Coldspot'
+NOT_SIGNIFICANT = 'Não significativo'
+
+
+# Function to project latitude/longitude (degrees) onto 3D points on the Earth's surface (km).
+# Euclidean distances between these points are chord lengths, so the KD-tree works
+# for any region without the distortion of treating degrees as a plane.
+def to_cartesian(latitude, longitude):
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return EARTH_RADIUS_KM * np.column_stack([
+        np.cos(lat) * np.cos(lon),
+        np.cos(lat) * np.sin(lon),
+        np.sin(lat),
+    ])
+
+
+# Great-circle distance (km) <-> chord length (km)
+def _to_chord(distance_km):
+    return 2 * EARTH_RADIUS_KM * np.sin(np.asarray(distance_km, dtype=float) / (2 * EARTH_RADIUS_KM))
+
+
+def _to_arc(chord_km):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord_km, dtype=float) / (2 * EARTH_RADIUS_KM), 0, 1))
+
+
+# Function to build the spatial index once per dataset
+def build_index(latitude, longitude):
+    return cKDTree(to_cartesian(latitude, longitude))
+
+
+# Function to find the positions of all indexed points within `radius_km` of each query point
+def radius_query(tree, latitude, longitude, radius_km):
+    return tree.query_ball_point(to_cartesian(np.atleast_1d(latitude), np.atleast_1d(longitude)), _to_chord(radius_km))
+
+
+# Function to find the k nearest indexed points; returns (distances in km, positions)
+def nearest_neighbors(tree, latitude, longitude, k=5):
+    distances, positions = tree.query(to_cartesian(np.atleast_1d(latitude), np.atleast_1d(longitude)), k=k)
+    return _to_arc(distances), positions
+
+
+# Function to build binary k-nearest-neighbour weights (each point plus its k nearest).
+# Every row has exactly k + 1 nonzeros, so memory stays linear in the number of points
+# however dense the data is.
+def knn_weights(tree, k):
+    n = tree.n
+    k = min(k + 1, n)
+    _, neighbors = tree.query(tree.data, k=k)
+    neighbors = np.asarray(neighbors).reshape(n, k)
+    rows = np.repeat(np.arange(n), k)
+    return sparse.csr_matrix((np.ones(n * k), (rows, neighbors.ravel())), shape=(n, n))
+
+
+# Function to adjust p-values for multiple testing (Benjamini-Hochberg false discovery rate)
+def fdr_adjust(p_values):
+    p_values = np.asarray(p_values, dtype=float)
+    n = len(p_values)
+    order = np.argsort(p_values)
+    ranked = p_values[order] * n / np.arange(1, n + 1)
+    adjusted = np.empty(n)
+    adjusted[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1)
+    return adjusted
+
+
+# Function to compute the Getis-Ord Gi* statistic for `values` with k-nearest-neighbour weights.
+# Meant to run on aggregated geo cells (one point per cell), not on raw detections.
+# Returns a DataFrame with the z-score, the two-sided p-value, its FDR-adjusted
+# q-value, the number of neighbours and the classification (hotspot / coldspot /
+# not significant). Cells are classified on the q-value: one test per cell at
+# level alpha would flag about alpha of the cells even on pure noise.
+def getis_ord_gi_star(tree, values, k=8, alpha=0.05):
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    weights = knn_weights(tree, k)
+
+    mean = values.mean()
+    std = np.sqrt((values ** 2).mean() - mean ** 2)
+    weight_sum = np.asarray(weights.sum(axis=1)).ravel()
+    # Binary weights: sum of squared weights equals the sum of weights
+    numerator = weights @ values - mean * weight_sum
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = std * np.sqrt((n * weight_sum - weight_sum ** 2) / (n - 1))
+        z_scores = np.where(denominator > 0, numerator / denominator, 0.0)
+    p_values = 2 * stats.norm.sf(np.abs(z_scores))
+    q_values = fdr_adjust(p_values)
+
+    significant = q_values < alpha
+    classification = np.where(significant & (z_scores > 0), HOTSPOT,
+                              np.where(significant & (z_scores < 0), COLDSPOT, NOT_SIGNIFICANT))
+    return pd.DataFrame({
+        'gi_z_score': z_scores,
+        'gi_p_value': p_values,
+        'gi_q_value': q_values,
+        'neighbors': weight_sum.astype(np.int64) - 1,
+        'hotspot': classification,
+    })
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# Plate layouts, one character class per position:
+# L = letter (A-Z), N = digit (0-9)
+MERCOSUL_PATTERN = "LLLNLNN"
+LEGACY_PATTERN = "LLLNNNN"
+
+# Default coordinate bounds (valid WGS84 range)
+LATITUDE_BOUNDS = (-90.0, 90.0)
+LONGITUDE_BOUNDS = (-180.0, 180.0)
+
+# Labels shown in the dashboard for each rule
+RULE_LABELS = {
+    'licensePlateDetected_format': 'Placa detectada fora do padrão (Mercosul/antigo)',
+    'irregularLicensePlate_format': 'Placa irregular fora do padrão (Mercosul/antigo)',
+    'macAddress_format': 'Endereço MAC inválido',
+    'latitude_range': 'Latitude ausente ou fora dos limites',
+    'longitude_range': 'Longitude ausente ou fora dos limites',
+}
+
+
+# Function to turn a string column into a (rows x width + 1) matrix of UTF-8 bytes.
+# The bytes are gathered straight from the Arrow offsets/data buffers, one position
+# at a time, instead of converting every Python string. The extra column makes
+# strings longer than `width` detectable. Missing values become empty strings.
+# The matrix is column-major, so each position is a contiguous array.
+def char_matrix(series, width):
+    array = _arrow_strings(series)
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data_buffer = array.buffers()[2]
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.zeros(0, dtype=np.uint8)
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+
+    chars = np.zeros((len(array), width + 1), dtype=np.uint8, order='F')
+    if len(array) and (lengths == lengths[0]).all():
+        # Every string has the same length: the data buffer already is the matrix
+        fixed = data[offsets[0]:offsets[-1]].reshape(len(array), lengths[0])
+        chars[:, :min(lengths[0], width + 1)] = fixed[:, :width + 1]
+        return chars
+    last = max(len(data) - 1, 0)
+    for position in range(width + 1):
+        column = data.take(np.minimum(starts + position, last)) if len(data) else chars[:, position]
+        chars[:, position] = np.where(lengths > position, column, 0)
+    return chars
+
+
+# Function to get the length of every string of a column, in characters or in UTF-8 bytes
+def string_lengths(series, in_bytes=False):
+    array = _arrow_strings(series)
+    lengths = pc.binary_length(array) if in_bytes else pc.utf8_length(array)
+    return lengths.to_numpy(zero_copy_only=False)
+
+
+# Function to get a column as an Arrow string array. Numeric columns are cast by
+# Arrow; object columns mixing numbers and strings (what read_csv produces for
+# malformed values in large files) are converted value by value.
+def _arrow_strings(series):
+    try:
+        array = pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        array = pa.array(series.astype('string'), from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    return pc.fill_null(pc.cast(array, pa.large_string()), '')
+
+
+# Character classes, looked up per byte through a 256-entry table
+LETTER, DIGIT, HEX = 1, 2, 4
+CHAR_CLASSES = np.zeros(256, dtype=np.uint8)
+CHAR_CLASSES[ord('A'):ord('Z') + 1] |= LETTER
+CHAR_CLASSES[ord('0'):ord('9') + 1] |= DIGIT | HEX
+CHAR_CLASSES[ord('A'):ord('F') + 1] |= HEX
+CHAR_CLASSES[ord('a'):ord('f') + 1] |= HEX
+
+
+def _has_length(chars, width):
+    valid = chars[:, width] == 0
+    for position in range(width):
+        valid &= chars[:, position] != 0
+    return valid
+
+
+# Function to look up the character class of every byte, position by position
+def _char_classes(chars, width):
+    return [CHAR_CLASSES[chars[:, position]] for position in range(width)]
+
+
+# Function to check per-position character classes against a layout
+def _matches_layout(classes, layout):
+    valid = np.ones(len(classes[0]), dtype=bool)
+    for position_classes, char_class in zip(classes, layout):
+        valid &= (position_classes & char_class) != 0
+    return valid
+
+
+def _pattern_classes(pattern):
+    return [LETTER if c == 'L' else DIGIT for c in pattern]
+
+
+# Function to flag plates that follow neither the Mercosul nor the legacy layout
+def invalid_plates(series):
+    width = len(MERCOSUL_PATTERN)
+    chars = char_matrix(series, width)
+    classes = _char_classes(chars, width)
+    valid = _has_length(chars, width) & (
+        _matches_layout(classes, _pattern_classes(MERCOSUL_PATTERN))
+        | _matches_layout(classes, _pattern_classes(LEGACY_PATTERN))
+    )
+    return ~valid
+
+
+# Function to flag MAC addresses not in the XX-XX-XX-XX-XX-XX (or XX:XX:...) format
+def invalid_mac_addresses(series):
+    chars = char_matrix(series, 17)
+    separator = chars[:, 2]
+    valid = _has_length(chars, 17) & ((separator == ord('-')) | (separator == ord(':')))
+    for position in range(17):
+        if position % 3 == 2:
+            valid &= chars[:, position] == separator
+        else:
+            valid &= (CHAR_CLASSES[chars[:, position]] & HEX) != 0
+    return ~valid
+
+
+# Function to flag missing or out-of-range coordinates
+def out_of_bounds(series, bounds):
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+    with np.errstate(invalid='ignore'):
+        valid = (values >= bounds[0]) & (values <= bounds[1])
+    return ~valid
+
+
+# Function to validate detection records.
+# Returns a DataFrame of boolean masks (True = row breaks the rule), with an
+# extra 'any' column, and a Series with the number of rows breaking each rule.
+def validate_records(df, latitude_bounds=LATITUDE_BOUNDS, longitude_bounds=LONGITUDE_BOUNDS):
+    masks = {}
+    if 'licensePlateDetected' in df.columns:
+        masks['licensePlateDetected_format'] = invalid_plates(df['licensePlateDetected'])
+    if 'irregularLicensePlate' in df.columns:
+        masks['irregularLicensePlate_format'] = invalid_plates(df['irregularLicensePlate'])
+    if 'macAddress' in df.columns:
+        masks['macAddress_format'] = invalid_mac_addresses(df['macAddress'])
+    if 'latitude' in df.columns:
+        masks['latitude_range'] = out_of_bounds(df['latitude'], latitude_bounds)
+    if 'longitude' in df.columns:
+        masks['longitude_range'] = out_of_bounds(df['longitude'], longitude_bounds)
+
+    masks = pd.DataFrame(masks, index=df.index)
+    masks['any'] = masks.to_numpy().any(axis=1) if masks.shape[1] else False
+    counts = pd.Series(masks.to_numpy().sum(axis=0), index=masks.columns)
+    return masks, counts
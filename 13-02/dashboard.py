@@ -1,7 +1,25 @@
+import io
+
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from correlation import correlate, dataset_hash
+from timeseries import METRICS, FREQUENCIES, build_time_index, build_rollups, filter_range, period_totals, rolling_mean, rollup_range
+
+
+# Parse 'Publish time' and build the rollups once per uploaded file
+@st.cache_data
+def load_time_series(content):
+    indexed = build_time_index(pd.read_csv(io.BytesIO(content)))
+    return indexed, build_rollups(indexed)
+
+
+# Correlation matrices, computed in chunks and cached per dataset hash
+@st.cache_data
+def load_correlations(content_hash, _content):
+    return correlate(lambda: pd.read_csv(io.BytesIO(_content), chunksize=10_000), exclude=('Post ID',))
+
 
 st.title('Social Media Performance')
 st.text('This dashboard displays social media performance metrics')
@@ -17,4 +35,54 @@ if file:
     
     st.write(df)
 
-    st.pyplot(fig)
\ No newline at end of file
+    st.pyplot(fig)
+
+    if 'Publish time' in df.columns:
+        st.header('Metrics over time')
+        indexed, rollups = load_time_series(file.getvalue())
+
+        if indexed.empty:
+            st.warning("No 'Publish time' value matches the expected format (MM/DD/YYYY HH:MM).")
+        else:
+            first_day = pd.to_datetime(indexed['publish_epoch'].iloc[0], unit='s').date()
+            last_day = pd.to_datetime(indexed['publish_epoch'].iloc[-1], unit='s').date()
+            if first_day < last_day:
+                start, end = st.slider('Period', min_value=first_day, max_value=last_day, value=(first_day, last_day))
+            else:
+                # st.slider needs a non-empty range
+                st.caption(f'Period: {first_day}')
+                start, end = first_day, last_day
+
+            col1, col2 = st.columns(2)
+            frequency = col1.selectbox('Granularity', list(FREQUENCIES), format_func=FREQUENCIES.get)
+            window = col2.number_input('Rolling window (periods)', min_value=1, max_value=52, value=4)
+
+            start, end = pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)
+            rollup = rollups[frequency]
+
+            metric = st.selectbox('Metric', METRICS)
+            trend = rollup_range(pd.DataFrame({
+                'Total': period_totals(rollup)[metric],
+                f'Rolling mean per post ({window})': rolling_mean(rollup, window)[metric],
+            }), start, end)
+            st.line_chart(trend)
+
+            st.write(filter_range(indexed, start, end))
+
+    st.header('Correlation')
+    correlations = load_correlations(dataset_hash(file.getvalue()), file.getvalue())
+    method = st.radio('Method', ['pearson', 'spearman'], horizontal=True, format_func=str.capitalize)
+    matrix = correlations[method]
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    image = ax.imshow(matrix.to_numpy(), cmap='coolwarm', vmin=-1, vmax=1)
+    ax.set_xticks(range(len(matrix.columns)), matrix.columns, rotation=45, ha='right')
+    ax.set_yticks(range(len(matrix.index)), matrix.index)
+    for i in range(len(matrix.index)):
+        for j in range(len(matrix.columns)):
+            ax.text(j, i, f"{matrix.iat[i, j]:.2f}", ha='center', va='center', fontsize=8)
+    fig.colorbar(image, ax=ax)
+
+    st.pyplot(fig)
+    st.caption('Coefficients use pairwise-complete observations; number of rows per pair:')
+    st.write(correlations['pairs'])
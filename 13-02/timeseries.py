@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+# Format of the 'Publish time' column in the Instagram exports (e.g. 04/05/2021 16:55)
+PUBLISH_TIME_FORMAT = '%m/%d/%Y %H:%M'
+
+METRICS = ['Reach', 'Likes', 'Impressions', 'Follows']
+
+# Rollup frequencies (pandas offset aliases) and their labels
+FREQUENCIES = {
+    'D': 'Daily',
+    'W': 'Weekly',
+    'MS': 'Monthly',
+}
+
+EPOCH_COLUMN = 'publish_epoch'
+
+
+# Function to parse 'Publish time' once, with an explicit format, into int64 epoch seconds.
+# Returns the frame sorted by publish time, so range filters can use binary search.
+def build_time_index(df, column='Publish time', time_format=PUBLISH_TIME_FORMAT):
+    timestamps = pd.to_datetime(df[column], format=time_format, errors='coerce')
+    epochs = timestamps.to_numpy(dtype='datetime64[s]').astype(np.int64)
+    indexed = df.assign(**{EPOCH_COLUMN: epochs})[timestamps.notna().to_numpy()]
+    return indexed.sort_values(EPOCH_COLUMN, kind='stable').reset_index(drop=True)
+
+
+# Function to convert a date/timestamp (or string) into epoch seconds
+def to_epoch(value):
+    return int(pd.Timestamp(value).to_datetime64().astype('datetime64[s]').astype(np.int64))
+
+
+# Function to select the posts published in [start, end) through binary search on the sorted epochs
+def filter_range(indexed, start=None, end=None):
+    epochs = indexed[EPOCH_COLUMN].to_numpy()
+    lo = 0 if start is None else np.searchsorted(epochs, to_epoch(start), side='left')
+    hi = len(epochs) if end is None else np.searchsorted(epochs, to_epoch(end), side='left')
+    return indexed.iloc[lo:hi]
+
+
+# Function to pre-compute the rollups (sum and number of reported values per period)
+# for every frequency. Missing values are skipped, so sparse columns such as
+# 'Follows' are not treated as zero.
+def build_rollups(indexed, metrics=METRICS, frequencies=FREQUENCIES):
+    values = indexed[metrics].apply(pd.to_numeric, errors='coerce')
+    values.index = pd.to_datetime(indexed[EPOCH_COLUMN].to_numpy(), unit='s')
+    rollups = {}
+    for frequency in frequencies:
+        resampled = values.resample(frequency, label='left', closed='left')
+        rollups[frequency] = pd.concat({'sum': resampled.sum(), 'count': resampled.count()}, axis=1)
+    return rollups
+
+
+# Function to select the rollup periods overlapping [start, end) through binary search.
+# Periods are labelled by their start, so the one containing `start` is included.
+def rollup_range(rollup, start=None, end=None):
+    lo = 0 if start is None else max(rollup.index.searchsorted(pd.Timestamp(start), side='right') - 1, 0)
+    hi = len(rollup) if end is None else rollup.index.searchsorted(pd.Timestamp(end), side='left')
+    return rollup.iloc[lo:hi]
+
+
+# Function to compute a rolling mean over the last `window` periods of a rollup.
+# Uses prefix sums, so each window costs O(1) no matter its size.
+def rolling_mean(rollup, window):
+    sums = rollup['sum'].to_numpy(dtype=float)
+    counts = rollup['count'].to_numpy(dtype=float)
+    prefix_sums = np.vstack([np.zeros((1, sums.shape[1])), np.cumsum(sums, axis=0)])
+    prefix_counts = np.vstack([np.zeros((1, counts.shape[1])), np.cumsum(counts, axis=0)])
+
+    ends = np.arange(1, len(sums) + 1)
+    starts = np.maximum(ends - window, 0)
+    window_sums = prefix_sums[ends] - prefix_sums[starts]
+    window_counts = prefix_counts[ends] - prefix_counts[starts]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(window_counts > 0, window_sums / window_counts, np.nan)
+    return pd.DataFrame(means, index=rollup.index, columns=rollup['sum'].columns)
+
+
+# Function to get the per-period totals of a rollup (NaN for periods with no reported value)
+def period_totals(rollup):
+    return rollup['sum'].where(rollup['count'] > 0)